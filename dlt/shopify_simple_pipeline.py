@@ -5,16 +5,534 @@ Extracts orders, products, and customers from Shopify and loads into DuckDB
 
 import os
 import dlt
-import requests
-from datetime import datetime
+import msgspec
+import orjson
+import pyarrow as pa
+import httpx
+from datetime import datetime, timezone
+from decimal import Decimal
 import time
-from typing import Dict, Any, List
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple, TypedDict
 
-@dlt.source
-def shopify_source():
+# # Get credentials from DLT secrets
+# api_token = dlt.secrets["shopify_api_token"]
+# shop_url = dlt.secrets["shopify_shop_url"]
+# Get credentials from Orchestra secrets
+API_TOKEN = os.environ['API_TOKEN']
+STORE_ID = os.environ['STORE_ID']
+SHOP_URL = f"{STORE_ID}.myshopify.com"
+
+BASE_URL = f"https://{SHOP_URL}/admin/api/2024-01"
+
+HEADERS = {
+    'X-Shopify-Access-Token': API_TOKEN,
+    'Content-Type': 'application/json'
+}
+
+# Shopify's REST API call bucket leaks at 2 requests per second; requests
+# only slow down once the bucket shared by all resources is nearly full
+BUCKET_LEAK_RATE = 2.0
+BUCKET_THRESHOLD = 0.8
+MAX_RETRIES = 5
+_rate_limit_lock = threading.Lock()
+_bucket_used = 0
+_bucket_size = 40
+_bucket_seen_at = 0.0
+
+
+def update_rate_limit(response: httpx.Response):
+    """
+    Record bucket usage from the X-Shopify-Shop-Api-Call-Limit header
+    """
+    global _bucket_used, _bucket_size, _bucket_seen_at
+    call_limit = response.headers.get('X-Shopify-Shop-Api-Call-Limit')
+    if call_limit:
+        used, size = map(int, call_limit.split('/'))
+        with _rate_limit_lock:
+            _bucket_used, _bucket_size = used, size
+            _bucket_seen_at = time.monotonic()
+
+
+def wait_for_rate_limit():
+    """
+    Block until the API call bucket has drained below the threshold
+    """
+    with _rate_limit_lock:
+        drained = (time.monotonic() - _bucket_seen_at) * BUCKET_LEAK_RATE
+        excess = _bucket_used - drained - BUCKET_THRESHOLD * _bucket_size
+    if excess > 0:
+        time.sleep(excess / BUCKET_LEAK_RATE)
+
+
+def fetch_page(client: httpx.Client, path: str, params: Dict[str, Any]) -> httpx.Response:
+    """
+    Fetch one page, honouring Retry-After when Shopify answers 429
+    """
+    retry_after = 0.0
+    for _ in range(MAX_RETRIES):
+        # Retry-After already covers the bucket draining, so don't wait
+        # on the full bucket reported by the 429 as well
+        if retry_after:
+            time.sleep(retry_after)
+        else:
+            wait_for_rate_limit()
+        response = client.get(path, params=params)
+        update_rate_limit(response)
+        if response.status_code != 429:
+            break
+        retry_after = float(response.headers.get('Retry-After', 1.0))
+    response.raise_for_status()
+    return response
+
+
+def next_page_info(response: httpx.Response) -> Optional[str]:
+    """
+    Extract the next page's page_info cursor from the Link header
+    """
+    link_header = response.headers.get('Link', '')
+    # The header may also carry a rel="previous" link before the next one
+    for link in link_header.split(','):
+        if 'rel="next"' in link:
+            cursor = link.partition('page_info=')[2]
+            return cursor.partition('&')[0].partition('>')[0] or None
+    return None
+
+
+def create_client() -> httpx.Client:
+    """
+    Create an HTTP/2 client for the Shopify Admin API
+
+    Requests made through one client, from any resource thread, are
+    multiplexed as streams over a single keep-alive TLS connection.
+    """
+    return httpx.Client(
+        http2=True,
+        base_url=BASE_URL,
+        headers=HEADERS,
+        limits=httpx.Limits(max_connections=4),
+        timeout=httpx.Timeout(60.0)
+    )
+
+
+def paginate(
+    client: httpx.Client,
+    endpoint: str,
+    decoder: msgspec.json.Decoder,
+    params: Dict[str, Any]
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Yield each page of items from a REST endpoint
+
+    The next page is fetched in the background while the caller processes
+    the current one, hiding the API round trip behind the flattening work.
+
+    Pages are decoded whole rather than parsed incrementally: limit and the
+    fields= selector keep them to a few hundred kilobytes. The one payload
+    that grows with the store, the bulk orders export, is streamed line by
+    line instead.
+    """
+    path = f"/{endpoint}.json"
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        next_page = executor.submit(fetch_page, client, path, params)
+        while True:
+            response = next_page.result()
+            items = decoder.decode(response.content).get(endpoint, [])
+            if not items:
+                return
+            
+            # Check for next page; Shopify only accepts limit and fields alongside page_info
+            page_info = next_page_info(response)
+            if page_info:
+                next_params = {key: params[key] for key in ('limit', 'fields') if key in params}
+                next_page = executor.submit(fetch_page, client, path, {**next_params, 'page_info': page_info})
+            
+            yield items
+            
+            if not page_info:
+                return
+
+
+def extract(
+    client: httpx.Client,
+    endpoint: str,
+    decoder: msgspec.json.Decoder,
+    flatten: Callable[[List[Dict[str, Any]], datetime], pa.RecordBatch],
+    params: Dict[str, Any],
+    extracted_at: datetime
+) -> Iterator[pa.RecordBatch]:
+    """
+    Page through a REST endpoint and yield each page flattened
+    """
+    try:
+        for items in paginate(client, endpoint, decoder, params):
+            yield flatten(items, extracted_at)
+    except httpx.HTTPError as e:
+        print(f"Error fetching {endpoint}: {e}")
+
+
+# Top-level order fields copied as-is into the orders table
+ORDER_FIELDS = (
+    'id', 'order_number', 'name', 'email', 'phone',
+    'created_at', 'updated_at', 'processed_at', 'cancelled_at', 'cancel_reason',
+    'currency', 'financial_status', 'fulfillment_status',
+    'total_price', 'subtotal_price', 'total_tax', 'total_discounts',
+    'total_weight', 'total_tip_received', 'note', 'tags'
+)
+
+# Address fields kept for an order's billing and shipping addresses
+ADDRESS_FIELDS = ('name', 'company', 'address1', 'city', 'province', 'country', 'zip')
+
+# Nested order objects, each with the (column, child field) pairs taken from it
+ORDER_NESTED_FIELDS = (
+    ('customer', (('customer_id', 'id'), ('customer_email', 'email'))),
+) + tuple(
+    (parent, tuple((f'{parent}_{child}', child) for child in ADDRESS_FIELDS))
+    for parent in ('billing_address', 'shipping_address')
+)
+
+# Product fields copied as-is into the products table
+PRODUCT_FIELDS = (
+    'id', 'title', 'body_html', 'vendor', 'product_type',
+    'created_at', 'updated_at', 'published_at', 'template_suffix', 'status',
+    'published_scope', 'tags', 'admin_graphql_api_id', 'handle'
+)
+
+# Customer fields copied into the customers table
+CUSTOMER_FIELDS = (
+    'id', 'email', 'accepts_marketing', 'created_at', 'updated_at',
+    'first_name', 'last_name', 'orders_count', 'state', 'total_spent',
+    'last_order_id', 'note', 'verified_email', 'multipass_identifier', 'tax_exempt',
+    'tags', 'last_order_name', 'currency', 'phone', 'addresses',
+    'accepts_marketing_updated_at', 'marketing_opt_in_level', 'tax_exemptions',
+    'admin_graphql_api_id', 'default_address'
+)
+
+
+def page_decoder(
+    key: str,
+    fields: Tuple[str, ...],
+    nested: Optional[Dict[str, Tuple[str, ...]]] = None
+) -> msgspec.json.Decoder:
+    """
+    Build a decoder for one API page that keeps only the given fields
+    """
+    nested_types = {
+        parent: Optional[TypedDict(f'{key}_{parent}', {child: Any for child in children}, total=False)]
+        for parent, children in (nested or {}).items()
+    }
+    item_type = TypedDict(key, {**{field: Any for field in fields}, **nested_types}, total=False)
+    return msgspec.json.Decoder(TypedDict(f'{key}_page', {key: List[item_type]}, total=False))
+
+
+# Page decoders; msgspec skips every field not listed (line items,
+# fulfillments, variants, ...) while parsing instead of building it
+ORDERS_DECODER = page_decoder('orders', ORDER_FIELDS, {
+    parent: tuple(child for _, child in children) for parent, children in ORDER_NESTED_FIELDS
+})
+PRODUCTS_DECODER = page_decoder('products', PRODUCT_FIELDS)
+CUSTOMERS_DECODER = page_decoder('customers', CUSTOMER_FIELDS)
+
+# fields= selectors so Shopify only sends what is flattened, cutting the
+# size of every page (orders otherwise include line items, fulfillments, ...)
+ORDER_API_FIELDS = ','.join(ORDER_FIELDS + tuple(parent for parent, _ in ORDER_NESTED_FIELDS))
+PRODUCT_API_FIELDS = ','.join(PRODUCT_FIELDS)
+CUSTOMER_API_FIELDS = ','.join(CUSTOMER_FIELDS)
+
+# Shopify timestamps carry a UTC offset and are stored normalized to UTC
+TIMESTAMP_TYPE = pa.timestamp('us', tz='UTC')
+
+
+def arrow_schema(
+    columns: Tuple[str, ...],
+    int_columns: Tuple[str, ...] = (),
+    bool_columns: Tuple[str, ...] = (),
+    timestamp_columns: Tuple[str, ...] = ()
+) -> pa.Schema:
+    """
+    Build an Arrow schema for a table plus its extracted_at column;
+    unlisted columns are strings and all but the id primary key nullable
+    """
+    def column_type(column: str) -> pa.DataType:
+        if column in int_columns:
+            return pa.int64()
+        if column in bool_columns:
+            return pa.bool_()
+        if column in timestamp_columns:
+            return TIMESTAMP_TYPE
+        return pa.string()
+    return pa.schema(
+        [pa.field(column, column_type(column), nullable=column != 'id') for column in columns]
+        + [('extracted_at', pa.dictionary(pa.int32(), TIMESTAMP_TYPE))]
+    )
+
+
+def record_batch(
+    columns: Dict[str, List[Any]],
+    schema: pa.Schema,
+    timestamp_columns: Tuple[str, ...],
+    extracted_at: datetime
+) -> pa.RecordBatch:
+    """
+    Build an Arrow record batch, parsing Shopify's ISO 8601 timestamps
+
+    extracted_at is the same for every row, so it is dictionary encoded:
+    a single timestamp value plus a zero index per row.
+    """
+    for column in timestamp_columns:
+        columns[column] = [datetime.fromisoformat(value) if value else None for value in columns[column]]
+    columns['extracted_at'] = pa.DictionaryArray.from_arrays(
+        pa.repeat(pa.scalar(0, pa.int32()), len(columns['id'])),
+        pa.array([extracted_at], type=TIMESTAMP_TYPE)
+    )
+    return pa.RecordBatch.from_pydict(columns, schema=schema)
+
+
+# All resources yield Arrow record batches, which DLT writes straight to
+# Parquet and DuckDB ingests natively, instead of normalizing row dicts
+ORDER_COLUMNS = ORDER_FIELDS + tuple(column for _, children in ORDER_NESTED_FIELDS for column, _ in children)
+ORDER_TIMESTAMP_COLUMNS = ('created_at', 'updated_at', 'processed_at', 'cancelled_at')
+ORDER_SCHEMA = arrow_schema(
+    ORDER_COLUMNS,
+    int_columns=('id', 'order_number', 'total_weight', 'customer_id'),
+    timestamp_columns=ORDER_TIMESTAMP_COLUMNS
+)
+
+PRODUCT_TIMESTAMP_COLUMNS = ('created_at', 'updated_at', 'published_at')
+PRODUCT_SCHEMA = arrow_schema(
+    PRODUCT_FIELDS,
+    int_columns=('id',),
+    timestamp_columns=PRODUCT_TIMESTAMP_COLUMNS
+)
+
+CUSTOMER_TIMESTAMP_COLUMNS = ('created_at', 'updated_at', 'accepts_marketing_updated_at')
+CUSTOMER_SCHEMA = arrow_schema(
+    CUSTOMER_FIELDS,
+    int_columns=('id', 'orders_count', 'last_order_id'),
+    bool_columns=('accepts_marketing', 'verified_email', 'tax_exempt'),
+    timestamp_columns=CUSTOMER_TIMESTAMP_COLUMNS
+)
+
+# Nested customer objects kept as JSON text
+CUSTOMER_JSON_COLUMNS = (('addresses', []), ('tax_exemptions', []), ('default_address', {}))
+
+
+def flatten_orders(orders_data: List[Dict[str, Any]], extracted_at: datetime) -> pa.RecordBatch:
+    """
+    Flatten a page of REST API orders column by column into a record batch
+    """
+    columns = {field: [order.get(field) for order in orders_data] for field in ORDER_FIELDS}
+    for parent, children in ORDER_NESTED_FIELDS:
+        # Look each nested object up once, not once per column taken from it
+        nested_objects = [order.get(parent) for order in orders_data]
+        for column, child in children:
+            columns[column] = [nested.get(child) if nested else None for nested in nested_objects]
+    return record_batch(columns, ORDER_SCHEMA, ORDER_TIMESTAMP_COLUMNS, extracted_at)
+
+
+def flatten_products(products_data: List[Dict[str, Any]], extracted_at: datetime) -> pa.RecordBatch:
+    """
+    Flatten a page of products column by column into a record batch
+    """
+    columns = {field: [product.get(field) for product in products_data] for field in PRODUCT_FIELDS}
+    return record_batch(columns, PRODUCT_SCHEMA, PRODUCT_TIMESTAMP_COLUMNS, extracted_at)
+
+
+def flatten_customers(customers_data: List[Dict[str, Any]], extracted_at: datetime) -> pa.RecordBatch:
+    """
+    Flatten a page of customers into a record batch, keeping nested objects as JSON strings
+    """
+    columns = {field: [customer.get(field) for customer in customers_data] for field in CUSTOMER_FIELDS}
+    for column, empty in CUSTOMER_JSON_COLUMNS:
+        columns[column] = [orjson.dumps(value or empty).decode() for value in columns[column]]
+    return record_batch(columns, CUSTOMER_SCHEMA, CUSTOMER_TIMESTAMP_COLUMNS, extracted_at)
+
+
+# Stores with more orders than this are exported with one GraphQL bulk
+# operation instead of paging through the REST API
+BULK_ORDERS_THRESHOLD = 10000
+BULK_POLL_INTERVAL = 5
+BULK_POLL_TIMEOUT = 1800
+BULK_BATCH_SIZE = 5000
+
+BULK_ORDERS_MUTATION = '''
+mutation {
+  bulkOperationRunQuery(query: """
+    {
+      orders {
+        edges {
+          node {
+            legacyResourceId
+            number
+            name
+            email
+            phone
+            createdAt
+            updatedAt
+            processedAt
+            cancelledAt
+            cancelReason
+            currencyCode
+            displayFinancialStatus
+            displayFulfillmentStatus
+            totalPriceSet { shopMoney { amount } }
+            subtotalPriceSet { shopMoney { amount } }
+            totalTaxSet { shopMoney { amount } }
+            totalDiscountsSet { shopMoney { amount } }
+            totalWeight
+            totalTipReceivedSet { shopMoney { amount } }
+            customer { legacyResourceId email }
+            billingAddress { name company address1 city province country zip }
+            shippingAddress { name company address1 city province country zip }
+            note
+            tags
+          }
+        }
+      }
+    }
+  """) {
+    bulkOperation { id }
+    userErrors { field message }
+  }
+}
+'''
+
+BULK_OPERATION_STATUS_QUERY = """
+{
+  currentBulkOperation { id status errorCode url }
+}
+"""
+
+# GraphQL fulfillment statuses as the REST API reports them. REST only
+# knows partial, fulfilled and restocked, and leaves every other order
+# (nothing shipped yet, whatever the fulfillment orders are doing) null
+FULFILLMENT_STATUSES = {
+    'FULFILLED': 'fulfilled',
+    'PARTIALLY_FULFILLED': 'partial',
+    'RESTOCKED': 'restocked',
+    'UNFULFILLED': None,
+    'IN_PROGRESS': None,
+    'ON_HOLD': None,
+    'OPEN': None,
+    'PENDING_FULFILLMENT': None,
+    'REQUEST_DECLINED': None,
+    'SCHEDULED': None,
+}
+
+
+def rest_amount(amount: str) -> str:
+    """
+    Format a GraphQL Decimal amount ("10.0") the way REST does ("10.00")
+    """
+    return f"{Decimal(amount):.2f}"
+
+
+# GraphQL order fields as (column, field path, conversion), matching the
+# columns produced from the REST API
+BULK_ORDER_FIELDS = (
+    ('id', ('legacyResourceId',), int),
+    ('order_number', ('number',), None),
+    ('name', ('name',), None),
+    ('email', ('email',), None),
+    ('phone', ('phone',), None),
+    ('created_at', ('createdAt',), None),
+    ('updated_at', ('updatedAt',), None),
+    ('processed_at', ('processedAt',), None),
+    ('cancelled_at', ('cancelledAt',), None),
+    ('cancel_reason', ('cancelReason',), str.lower),
+    ('currency', ('currencyCode',), None),
+    ('financial_status', ('displayFinancialStatus',), str.lower),
+    ('fulfillment_status', ('displayFulfillmentStatus',), FULFILLMENT_STATUSES.get),
+    ('total_price', ('totalPriceSet', 'shopMoney', 'amount'), rest_amount),
+    ('subtotal_price', ('subtotalPriceSet', 'shopMoney', 'amount'), rest_amount),
+    ('total_tax', ('totalTaxSet', 'shopMoney', 'amount'), rest_amount),
+    ('total_discounts', ('totalDiscountsSet', 'shopMoney', 'amount'), rest_amount),
+    ('total_weight', ('totalWeight',), int),
+    ('total_tip_received', ('totalTipReceivedSet', 'shopMoney', 'amount'), rest_amount),
+    ('note', ('note',), None),
+    ('tags', ('tags',), ', '.join),
+    ('customer_id', ('customer', 'legacyResourceId'), int),
+    ('customer_email', ('customer', 'email'), None),
+) + tuple(
+    (f'{column}_{child}', (parent, child), None)
+    for column, parent in (('billing_address', 'billingAddress'), ('shipping_address', 'shippingAddress'))
+    for child in ADDRESS_FIELDS
+)
+
+
+def graphql(client: httpx.Client, query: str) -> Dict[str, Any]:
+    """
+    Run a GraphQL query and return its data, raising on GraphQL errors
+    """
+    response = client.post('/graphql.json', content=orjson.dumps({'query': query}))
+    response.raise_for_status()
+    result = orjson.loads(response.content)
+    if result.get('errors'):
+        raise RuntimeError(f"GraphQL errors: {result['errors']}")
+    return result['data']
+
+
+def bulk_export_orders(
+    client: httpx.Client,
+    extracted_at: datetime
+) -> Iterator[pa.RecordBatch]:
+    """
+    Export all orders with a GraphQL bulk operation and yield them in record batches
+    """
+    data = graphql(client, BULK_ORDERS_MUTATION)
+    user_errors = data['bulkOperationRunQuery']['userErrors']
+    if user_errors:
+        raise RuntimeError(f"Bulk operation not started: {user_errors}")
+
+    # Shopify builds the export in the background; poll until it is ready
+    deadline = time.monotonic() + BULK_POLL_TIMEOUT
+    while True:
+        time.sleep(BULK_POLL_INTERVAL)
+        operation = graphql(client, BULK_OPERATION_STATUS_QUERY)['currentBulkOperation']
+        if operation['status'] == 'COMPLETED':
+            break
+        if operation['status'] not in ('CREATED', 'RUNNING', 'CANCELING'):
+            raise RuntimeError(f"Bulk operation {operation['status']}: {operation['errorCode']}")
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Bulk operation still {operation['status']} after {BULK_POLL_TIMEOUT}s")
+
+    # No url means the export matched no orders
+    if not operation['url']:
+        return
+
+    columns = {column: [] for column in ORDER_COLUMNS}
+    # The result is a signed download URL, so it is fetched without the API token
+    with httpx.stream('GET', operation['url'], timeout=httpx.Timeout(60.0)) as download:
+        download.raise_for_status()
+        for line in download.iter_lines():
+            if not line:
+                continue
+            node = orjson.loads(line)
+            for column, path, convert in BULK_ORDER_FIELDS:
+                value = node
+                for key in path:
+                    value = value.get(key) if value else None
+                columns[column].append(convert(value) if convert and value is not None else value)
+            if len(columns['id']) == BULK_BATCH_SIZE:
+                yield record_batch(columns, ORDER_SCHEMA, ORDER_TIMESTAMP_COLUMNS, extracted_at)
+                columns = {column: [] for column in ORDER_COLUMNS}
+    if columns['id']:
+        yield record_batch(columns, ORDER_SCHEMA, ORDER_TIMESTAMP_COLUMNS, extracted_at)
+
+
+@dlt.source(parallelized=True)
+def shopify_source(client: httpx.Client):
     """
     DLT source for Shopify API
+
+    All resources are extracted in parallel by DLT's extract worker pool
+    (5 workers by default), so one pipeline.run walks every endpoint at once.
+    They share the given client, so their concurrent requests travel over a
+    single HTTP/2 connection to the store; the caller owns and closes it.
     """
+    # One extraction timestamp shared by every row loaded in this run
+    extracted_at = datetime.now(timezone.utc)
     
     @dlt.resource(
         write_disposition="merge",
@@ -24,109 +542,19 @@ def shopify_source():
         """
         Extract orders from Shopify API
         """
-        # # Get credentials from DLT secrets
-        # api_token = dlt.secrets["shopify_api_token"]
-        # shop_url = dlt.secrets["shopify_shop_url"]
-        # Get credentials from Orchestra secrets
-        api_token = os.getenv('API_TOKEN')
-        store_id = os.getenv('STORE_ID')
-        shop_url = f"{store_id}.myshopify.com"
-        
-        headers = {
-            'X-Shopify-Access-Token': api_token,
-            'Content-Type': 'application/json'
-        }
-        
-        base_url = f"https://{shop_url}/admin/api/2024-01"
-        
-        # Get orders with pagination
-        params = {
-            'limit': limit,
-            'status': status
-        }
-        
-        page_info = None
-        while True:
-            if page_info:
-                params['page_info'] = page_info
-            
+        # Large stores are exported in one bulk operation, falling back
+        # to REST pagination for small stores or if the export fails
+        if status == "any":
             try:
-                response = requests.get(
-                    f"{base_url}/orders.json",
-                    headers=headers,
-                    params=params
-                )
-                response.raise_for_status()
-                
-                data = response.json()
-                orders_data = data.get('orders', [])
-                
-                if not orders_data:
-                    break
-                
-                for order in orders_data:
-                    # Flatten and clean the order data
-                    order_flat = {
-                        'id': order.get('id'),
-                        'order_number': order.get('order_number'),
-                        'name': order.get('name'),
-                        'email': order.get('email'),
-                        'phone': order.get('phone'),
-                        'created_at': order.get('created_at'),
-                        'updated_at': order.get('updated_at'),
-                        'processed_at': order.get('processed_at'),
-                        'cancelled_at': order.get('cancelled_at'),
-                        'cancel_reason': order.get('cancel_reason'),
-                        'currency': order.get('currency'),
-                        'financial_status': order.get('financial_status'),
-                        'fulfillment_status': order.get('fulfillment_status'),
-                        'total_price': order.get('total_price'),
-                        'subtotal_price': order.get('subtotal_price'),
-                        'total_tax': order.get('total_tax'),
-                        'total_discounts': order.get('total_discounts'),
-                        'total_weight': order.get('total_weight'),
-                        'total_tip_received': order.get('total_tip_received'),
-                        'customer_id': order.get('customer', {}).get('id') if order.get('customer') else None,
-                        'customer_email': order.get('customer', {}).get('email') if order.get('customer') else None,
-                        'billing_address_name': order.get('billing_address', {}).get('name') if order.get('billing_address') else None,
-                        'billing_address_company': order.get('billing_address', {}).get('company') if order.get('billing_address') else None,
-                        'billing_address_address1': order.get('billing_address', {}).get('address1') if order.get('billing_address') else None,
-                        'billing_address_city': order.get('billing_address', {}).get('city') if order.get('billing_address') else None,
-                        'billing_address_province': order.get('billing_address', {}).get('province') if order.get('billing_address') else None,
-                        'billing_address_country': order.get('billing_address', {}).get('country') if order.get('billing_address') else None,
-                        'billing_address_zip': order.get('billing_address', {}).get('zip') if order.get('billing_address') else None,
-                        'shipping_address_name': order.get('shipping_address', {}).get('name') if order.get('shipping_address') else None,
-                        'shipping_address_company': order.get('shipping_address', {}).get('company') if order.get('shipping_address') else None,
-                        'shipping_address_address1': order.get('shipping_address', {}).get('address1') if order.get('shipping_address') else None,
-                        'shipping_address_city': order.get('shipping_address', {}).get('city') if order.get('shipping_address') else None,
-                        'shipping_address_province': order.get('shipping_address', {}).get('province') if order.get('shipping_address') else None,
-                        'shipping_address_country': order.get('shipping_address', {}).get('country') if order.get('shipping_address') else None,
-                        'shipping_address_zip': order.get('shipping_address', {}).get('zip') if order.get('shipping_address') else None,
-                        'note': order.get('note'),
-                        'tags': order.get('tags'),
-                        'extracted_at': datetime.now().isoformat()
-                    }
-                    yield order_flat
-                
-                # Check for next page
-                link_header = response.headers.get('Link', '')
-                if 'rel="next"' in link_header:
-                    # Extract page_info from Link header
-                    import re
-                    next_match = re.search(r'page_info=([^&>]+)', link_header)
-                    if next_match:
-                        page_info = next_match.group(1)
-                    else:
-                        break
-                else:
-                    break
-                    
-                # Rate limiting - Shopify allows 2 requests per second
-                time.sleep(0.5)
-                
-            except requests.exceptions.RequestException as e:
-                print(f"Error fetching orders: {e}")
-                break
+                response = fetch_page(client, '/orders/count.json', {'status': status})
+                if orjson.loads(response.content)['count'] > BULK_ORDERS_THRESHOLD:
+                    yield from bulk_export_orders(client, extracted_at)
+                    return
+            except (httpx.HTTPError, RuntimeError) as e:
+                print(f"Error exporting orders in bulk, falling back to pagination: {e}")
+        
+        params = {'limit': limit, 'status': status, 'fields': ORDER_API_FIELDS}
+        yield from extract(client, 'orders', ORDERS_DECODER, flatten_orders, params, extracted_at)
     
     @dlt.resource(
         write_disposition="merge",
@@ -136,83 +564,8 @@ def shopify_source():
         """
         Extract products from Shopify API
         """
-        # # Get credentials from DLT secrets
-        # api_token = dlt.secrets["shopify_api_token"]
-        # shop_url = dlt.secrets["shopify_shop_url"]
-        # Get credentials from Orchestra secrets
-        api_token = os.getenv('API_TOKEN')
-        store_id = os.getenv('STORE_ID')
-        shop_url = f"{store_id}.myshopify.com"
-
-        headers = {
-            'X-Shopify-Access-Token': api_token,
-            'Content-Type': 'application/json'
-        }
-        
-        base_url = f"https://{shop_url}/admin/api/2024-01"
-        
-        params = {
-            'limit': limit
-        }
-        
-        page_info = None
-        while True:
-            if page_info:
-                params['page_info'] = page_info
-            
-            try:
-                response = requests.get(
-                    f"{base_url}/products.json",
-                    headers=headers,
-                    params=params
-                )
-                response.raise_for_status()
-                
-                data = response.json()
-                products_data = data.get('products', [])
-                
-                if not products_data:
-                    break
-                
-                for product in products_data:
-                    # Flatten and clean the product data
-                    product_flat = {
-                        'id': product.get('id'),
-                        'title': product.get('title'),
-                        'body_html': product.get('body_html'),
-                        'vendor': product.get('vendor'),
-                        'product_type': product.get('product_type'),
-                        'created_at': product.get('created_at'),
-                        'updated_at': product.get('updated_at'),
-                        'published_at': product.get('published_at'),
-                        'template_suffix': product.get('template_suffix'),
-                        'status': product.get('status'),
-                        'published_scope': product.get('published_scope'),
-                        'tags': product.get('tags'),
-                        'admin_graphql_api_id': product.get('admin_graphql_api_id'),
-                        'handle': product.get('handle'),
-                        'extracted_at': datetime.now().isoformat()
-                    }
-                    yield product_flat
-                
-                # Check for next page
-                link_header = response.headers.get('Link', '')
-                if 'rel="next"' in link_header:
-                    import re
-                    next_match = re.search(r'page_info=([^&>]+)', link_header)
-                    if next_match:
-                        page_info = next_match.group(1)
-                    else:
-                        break
-                else:
-                    break
-                    
-                # Rate limiting
-                time.sleep(0.5)
-                
-            except requests.exceptions.RequestException as e:
-                print(f"Error fetching products: {e}")
-                break
+        params = {'limit': limit, 'fields': PRODUCT_API_FIELDS}
+        yield from extract(client, 'products', PRODUCTS_DECODER, flatten_products, params, extracted_at)
     
     @dlt.resource(
         write_disposition="merge",
@@ -222,94 +575,8 @@ def shopify_source():
         """
         Extract customers from Shopify API
         """
-        # # Get credentials from DLT secrets
-        # api_token = dlt.secrets["shopify_api_token"]
-        # shop_url = dlt.secrets["shopify_shop_url"]
-        # Get credentials from Orchestra secrets
-        api_token = os.getenv('API_TOKEN')
-        store_id = os.getenv('STORE_ID')
-        shop_url = f"{store_id}.myshopify.com"
-
-        headers = {
-            'X-Shopify-Access-Token': api_token,
-            'Content-Type': 'application/json'
-        }
-        
-        base_url = f"https://{shop_url}/admin/api/2024-01"
-        
-        params = {
-            'limit': limit
-        }
-        
-        page_info = None
-        while True:
-            if page_info:
-                params['page_info'] = page_info
-            
-            try:
-                response = requests.get(
-                    f"{base_url}/customers.json",
-                    headers=headers,
-                    params=params
-                )
-                response.raise_for_status()
-                
-                data = response.json()
-                customers_data = data.get('customers', [])
-                
-                if not customers_data:
-                    break
-                
-                for customer in customers_data:
-                    # Flatten and clean the customer data
-                    customer_flat = {
-                        'id': customer.get('id'),
-                        'email': customer.get('email'),
-                        'accepts_marketing': customer.get('accepts_marketing'),
-                        'created_at': customer.get('created_at'),
-                        'updated_at': customer.get('updated_at'),
-                        'first_name': customer.get('first_name'),
-                        'last_name': customer.get('last_name'),
-                        'orders_count': customer.get('orders_count'),
-                        'state': customer.get('state'),
-                        'total_spent': customer.get('total_spent'),
-                        'last_order_id': customer.get('last_order_id'),
-                        'note': customer.get('note'),
-                        'verified_email': customer.get('verified_email'),
-                        'multipass_identifier': customer.get('multipass_identifier'),
-                        'tax_exempt': customer.get('tax_exempt'),
-                        'tags': customer.get('tags'),
-                        'last_order_name': customer.get('last_order_name'),
-                        'currency': customer.get('currency'),
-                        'phone': customer.get('phone'),
-                        'addresses': str(customer.get('addresses', [])),
-                        'accepts_marketing_updated_at': customer.get('accepts_marketing_updated_at'),
-                        'marketing_opt_in_level': customer.get('marketing_opt_in_level'),
-                        'tax_exemptions': str(customer.get('tax_exemptions', [])),
-                        'admin_graphql_api_id': customer.get('admin_graphql_api_id'),
-                        'default_address': str(customer.get('default_address', {})),
-                        'extracted_at': datetime.now().isoformat()
-                    }
-                    yield customer_flat
-                
-                # Check for next page
-                link_header = response.headers.get('Link', '')
-                if 'rel="next"' in link_header:
-                    import re
-                    next_match = re.search(r'page_info=([^&>]+)', link_header)
-                    if next_match:
-                        page_info = next_match.group(1)
-                    else:
-                        break
-                else:
-                    break
-                    
-                # Rate limiting
-                time.sleep(0.5)
-                
-            except requests.exceptions.RequestException as e:
-                print(f"Error fetching customers: {e}")
-                break
+        params = {'limit': limit, 'fields': CUSTOMER_API_FIELDS}
+        yield from extract(client, 'customers', CUSTOMERS_DECODER, flatten_customers, params, extracted_at)
     
     return orders, products, customers
 
@@ -317,6 +584,11 @@ def shopify_source():
 if __name__ == "__main__":
     print("Running Simple Shopify API Pipeline...")
     
+    # Resources yield Arrow batches; give them the same _dlt_id and
+    # _dlt_load_id columns as row dicts so they merge into existing tables
+    dlt.config["normalize.parquet_normalizer.add_dlt_id"] = True
+    dlt.config["normalize.parquet_normalizer.add_dlt_load_id"] = True
+    
     # Initialize the pipeline with DuckDB destination
     pipeline = dlt.pipeline(
         pipeline_name="shopify_simple_pipeline",
@@ -324,34 +596,14 @@ if __name__ == "__main__":
         dataset_name="shopify_data"
     )
     
-    # Run the pipeline
-    source = shopify_source()
-    
-    # Extract orders
-    print("Extracting orders...")
-    orders_info = pipeline.run(
-        source.orders(limit=250, status="any"),
-        table_name="orders"
-    )
-    
-    # Extract products
-    print("Extracting products...")
-    products_info = pipeline.run(
-        source.products(limit=250),
-        table_name="products"
-    )
-    
-    # Extract customers
-    print("Extracting customers...")
-    customers_info = pipeline.run(
-        source.customers(limit=250),
-        table_name="customers"
-    )
+    # Run the whole source in one go - its resources are extracted
+    # concurrently, so their API calls overlap instead of running back to back
+    print("Extracting orders, products and customers...")
+    with create_client() as client:
+        load_info = pipeline.run(shopify_source(client))
     
     print("Pipeline completed successfully!")
-    print(f"Orders loaded: {orders_info}")
-    print(f"Products loaded: {products_info}")
-    print(f"Customers loaded: {customers_info}")
+    print(f"Load info: {load_info}")
     
     print("\nYou can now query the data using DuckDB:")
     print("import duckdb")
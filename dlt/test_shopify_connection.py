@@ -12,24 +12,13 @@ def test_shopify_connection():
     Test the Shopify API connection using stored credentials
     """
     try:
-        # # Get credentials from DLT secrets
-        # api_token = dlt.secrets["shopify_api_token"]
-        # shop_url = dlt.secrets["shopify_shop_url"]
-        # Get credentials from Orchestra secrets
-        api_token = os.getenv('API_TOKEN')
-        store_id = os.getenv('STORE_ID')
-        shop_url = f"{store_id}.myshopify.com"
+        # Same credentials and endpoint as the pipeline (Orchestra secrets)
+        from shopify_simple_pipeline import API_TOKEN as api_token, SHOP_URL as shop_url
+        from shopify_simple_pipeline import BASE_URL as base_url, HEADERS as headers
 
         print(f"Testing connection to: {shop_url}")
         print(f"API Token: {api_token[:10]}...{api_token[-4:]} (truncated for security)")
         
-        headers = {
-            'X-Shopify-Access-Token': api_token,
-            'Content-Type': 'application/json'
-        }
-        
-        base_url = f"https://{shop_url}/admin/api/2024-01"
-        
         # Test 1: Get shop information
         print("\n1. Testing shop information...")
         response = requests.get(f"{base_url}/shop.json", headers=headers)
@@ -85,7 +74,7 @@ def test_shopify_connection():
         
     except KeyError as e:
         print(f"✗ Configuration error: {e}")
-        print("Please check your .dlt/secrets.toml file and ensure all required credentials are set.")
+        print("Please ensure the API_TOKEN and STORE_ID environment variables are set.")
         return False
         
     except requests.exceptions.HTTPError as e:
@@ -97,7 +86,7 @@ def test_shopify_connection():
             print("- read_customers")
         elif e.response.status_code == 404:
             print(f"✗ Not found error (404): Invalid shop URL")
-            print("Please check your shop URL in .dlt/secrets.toml")
+            print("Please check the STORE_ID environment variable")
         else:
             print(f"✗ HTTP error: {e}")
         return False